@@ -0,0 +1,37 @@
+"""
+Ahead of time compilation of numba kernels into the sudoku_nb extension module
+Solvers prefer the compiled module, so no JIT compilation happens on start
+The module records hash of the kernels source, solvers ignore it once the source changes
+
+Build from the sudoku_solver directory:
+python -m sudoku._aot_build
+"""
+import os
+from numba.pycc import CC
+
+from sudoku import _climb_nb
+from sudoku.solve import kernels_source_hash
+
+cc = CC('sudoku_nb')
+# place the module next to the kernels
+cc.output_dir = os.path.dirname(os.path.abspath(__file__))
+# hash is a compile time constant of the module
+SOURCE_HASH = kernels_source_hash()
+
+
+def source_hash() -> int:
+    """
+    :return: Hash of the kernels source the module was built from
+    """
+    return SOURCE_HASH
+
+
+# the extension has its own random generator, it must be seeded separately from the JIT one
+cc.export('seed', 'void(u4)')(_climb_nb.seed.py_func)
+cc.export('climb', 'UniTuple(i8, 2)(i1[:, :], i1[:], i1[:], i4[:], i8)')(_climb_nb.climb.py_func)
+cc.export('beta_climb', 'UniTuple(i8, 2)(i1[:, :], i1[:], i1[:], i4[:], f8, f8, i8)')(_climb_nb.beta_climb.py_func)
+cc.export('source_hash', 'i8()')(source_hash)
+
+
+if __name__ == '__main__':
+    cc.compile()
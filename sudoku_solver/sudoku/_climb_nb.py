@@ -0,0 +1,211 @@
+"""
+Numba compiled kernels of the basic hill climbing algorithm
+The board is represented by a raw 2D int8 array, blanks are not allowed
+"""
+import numpy as np
+from numba import njit
+
+
+@njit(cache=True)
+def seed(value):
+    """
+    Seeds random generator used by compiled kernels (it is separate from numpy's one)
+    """
+    np.random.seed(value)
+
+
+@njit(cache=True)
+def _bit(val) -> int:
+    """
+    :return: Bit representing the value in an area mask (blank maps to no bit)
+    """
+    return 1 << (int(val) - 1) if val > 0 else 0
+
+
+@njit(cache=True)
+def _popcount(mask) -> int:
+    """
+    :return: Number of set bits in the mask
+    """
+    count = 0
+    while mask:
+        mask &= mask - 1
+        count += 1
+    return count
+
+
+@njit(cache=True)
+def score_board(b) -> int:
+    """
+    Counts values missing in all areas (rows, columns and squares)
+    :param b: 2D array of values
+    :return: Number of mistakes on the board
+    """
+    size = b.shape[0]
+    size_sq = int(np.sqrt(size))
+    present = 0
+    for a in range(size):
+        row, col, sq = 0, 0, 0
+        # top left corner of the square
+        y0, x0 = (a // size_sq) * size_sq, (a % size_sq) * size_sq
+        for k in range(size):
+            row |= _bit(b[a, k])
+            col |= _bit(b[k, a])
+            sq |= _bit(b[y0 + k // size_sq, x0 + k % size_sq])
+        present += _popcount(row) + _popcount(col) + _popcount(sq)
+    return 3 * size * size - present
+
+
+@njit(cache=True)
+def _column_missing(b, x) -> int:
+    """
+    :return: Number of values missing in the column
+    """
+    size = b.shape[0]
+    mask = 0
+    for k in range(size):
+        mask |= _bit(b[k, x])
+    return size - _popcount(mask)
+
+
+@njit(cache=True)
+def _square_missing(b, y, x, size_sq) -> int:
+    """
+    :return: Number of values missing in the square containing (y, x)
+    """
+    y0, x0 = y - y % size_sq, x - x % size_sq
+    mask = 0
+    for k in range(size_sq * size_sq):
+        mask |= _bit(b[y0 + k // size_sq, x0 + k % size_sq])
+    return size_sq * size_sq - _popcount(mask)
+
+
+@njit(cache=True)
+def pick_pair(idx, start, end) -> (int, int):
+    """
+    Picks two different random tiles
+    :param idx: indexes of tiles
+    :param start: first index in idx which can be picked
+    :param end: index in idx after the last one which can be picked
+    :return: indexes of picked tiles
+    """
+    n = end - start
+    a = np.random.randint(0, n)
+    c = np.random.randint(0, n - 1)
+    if c >= a:
+        c += 1
+    return idx[start + a], idx[start + c]
+
+
+@njit(cache=True)
+def swap_in_row(b, row, i, j):
+    """
+    Swaps two tiles in a row
+    """
+    b[row, i], b[row, j] = b[row, j], b[row, i]
+
+
+@njit(cache=True)
+def climb(b, unfilled_rows, unfilled_idx, offsets, max_iter) -> (int, int):
+    """
+    Hill climbing algorithm, modifies the board in place
+    Missing values of columns and squares are cached, only areas affected by a step are evaluated
+    :param b: 2D array of values, filled so that all rows are unique
+    :param unfilled_rows: indexes of rows with at least 2 blanks in the initial state
+    :param unfilled_idx: indexes of blanks of all unfilled rows
+    :param offsets: blanks of row unfilled_rows[i] are unfilled_idx[offsets[i]:offsets[i + 1]]
+    :param max_iter: Maximal number of iterations
+    :return: Score of the best solution, number of iterations
+    """
+    size = b.shape[0]
+    size_sq = int(np.sqrt(size))
+    # missing values in all columns and squares, updated after each step (rows can not change)
+    cols_missing = np.empty(size, dtype=np.int64)
+    squares_missing = np.empty(size, dtype=np.int64)
+    for k in range(size):
+        cols_missing[k] = _column_missing(b, k)
+        squares_missing[k] = _square_missing(b, (k // size_sq) * size_sq, (k % size_sq) * size_sq, size_sq)
+
+    score_min = score_board(b)
+    rows_num = unfilled_rows.shape[0]
+    for it in range(max_iter):
+        # step
+        r = np.random.randint(0, rows_num)
+        row = unfilled_rows[r]
+        i, j = pick_pair(unfilled_idx, offsets[r], offsets[r + 1])
+        swap_in_row(b, row, i, j)
+        # evaluate affected areas only
+        sq_i = row // size_sq * size_sq + i // size_sq
+        sq_j = row // size_sq * size_sq + j // size_sq
+        col_i, col_j = _column_missing(b, i), _column_missing(b, j)
+        sq_i_missing = _square_missing(b, row, i, size_sq)
+        sq_j_missing = _square_missing(b, row, j, size_sq) if sq_i != sq_j else sq_i_missing
+        delta = (col_i - cols_missing[i]) + (col_j - cols_missing[j]) + (sq_i_missing - squares_missing[sq_i])
+        if sq_i != sq_j:
+            delta += sq_j_missing - squares_missing[sq_j]
+        if delta <= 0:
+            cols_missing[i], cols_missing[j] = col_i, col_j
+            squares_missing[sq_i], squares_missing[sq_j] = sq_i_missing, sq_j_missing
+            score_min += delta
+            # check if the solution was found
+            if score_min == 0:
+                return 0, it + 1
+        else:
+            # worse state, undo the step
+            swap_in_row(b, row, i, j)
+    return score_min, max_iter
+
+
+@njit(cache=True)
+def shuffle_row(b, row, idx, start, end):
+    """
+    Shuffles tiles of a row randomly
+    :param idx: indexes of tiles
+    :param start: first index in idx which is shuffled
+    :param end: index in idx after the last one which is shuffled
+    """
+    for k in range(end - 1, start, -1):
+        j = start + np.random.randint(0, k - start + 1)
+        swap_in_row(b, row, idx[k], idx[j])
+
+
+@njit(cache=True)
+def beta_climb(b, unfilled_rows, unfilled_idx, offsets, n, beta, max_iter) -> (int, int):
+    """
+    ß-hill climbing algorithm (custom version), modifies the board in place
+    Each step swaps 2 tiles of a row with probability of n or regenerates the row with probability of beta
+    :param b: 2D array of values, filled so that all rows are unique
+    :param unfilled_rows: indexes of rows with at least 2 blanks in the initial state
+    :param unfilled_idx: indexes of blanks of all unfilled rows
+    :param offsets: blanks of row unfilled_rows[i] are unfilled_idx[offsets[i]:offsets[i + 1]]
+    :param n: probability of exploiting a row
+    :param beta: probability of row mutation
+    :param max_iter: Maximal number of iterations
+    :return: Score of the best solution, number of iterations
+    """
+    scratch = b.copy()
+    score_min = score_board(b)
+    # probability of the row being swapped or regenerated
+    modify_prob = beta + n * (1 - beta)
+    rows_num = unfilled_rows.shape[0]
+    for it in range(max_iter):
+        # step on a copy of the board
+        scratch[:] = b
+        for r in range(rows_num):
+            # one random draw decides which operator modifies the row
+            draw = np.random.random()
+            if draw < beta:
+                # blanks hold exactly the values missing in the row, regenerating is shuffling them
+                shuffle_row(scratch, unfilled_rows[r], unfilled_idx, offsets[r], offsets[r + 1])
+            elif draw < modify_prob:
+                i, j = pick_pair(unfilled_idx, offsets[r], offsets[r + 1])
+                swap_in_row(scratch, unfilled_rows[r], i, j)
+        score = score_board(scratch)
+        # update best result
+        if score <= score_min:
+            score_min = score
+            b[:] = scratch
+            # check if the solution was found
+            if score == 0:
+                return 0, it + 1
+    return score_min, max_iter
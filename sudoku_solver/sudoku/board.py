@@ -30,12 +30,20 @@ class Board:
         self._board = np.full(shape=(size, size), fill_value=0)
         # save initial state
         self._board_init = None
+        self._init_mask = None
         # count digits to print
         self._max_digits = self._count_digits(size)
-
-        # dictionary of indexes of lines which contain at least 2 blanks
-        # format: <unfilled line index> : <list of indexes of unfilled tiles>
-        self._unfilled = {}
+        # printable versions of all values
+        self._tile_strs = [self._center_number(x) for x in range(size + 1)]
+        # bit representation of each value (blank maps to no bit), area is valid when all bits are set
+        self._value_bits = np.array([0] + [1 << i for i in range(size)])
+        self._full_mask = (1 << size) - 1
+
+        # unfilled tiles of lines which contain at least 2 blanks, stored as flat arrays
+        # indexes of unfilled tiles of line _unfilled_rows[i] are _unfilled_idx[_unfilled_offsets[i]:_unfilled_offsets[i + 1]]
+        self._unfilled_rows = np.empty(0, dtype=np.int8)
+        self._unfilled_idx = np.empty(0, dtype=np.int8)
+        self._unfilled_offsets = np.zeros(1, dtype=np.int32)
 
     def set_init_state(self):
         """
@@ -49,11 +57,18 @@ class Board:
         if self._init_from_file(path):
             # save initial state
             self._board_init = self._board.copy()
+            self._init_mask = self._board_init != 0
             # init unfilled
+            rows, idx, offsets = [], [], [0]
             for i, line in enumerate(self._board_init):
                 num, indexes = self._count_unfilled(line)
                 if num >= 2:
-                    self._unfilled[i] = indexes
+                    rows.append(i)
+                    idx.extend(indexes)
+                    offsets.append(len(idx))
+            self._unfilled_rows = np.array(rows, dtype=np.int8)
+            self._unfilled_idx = np.array(idx, dtype=np.int8)
+            self._unfilled_offsets = np.array(offsets, dtype=np.int32)
             return True
 
         return False
@@ -72,11 +87,21 @@ class Board:
                 unfilled.append(i)
         return num, unfilled
 
+    def unfilled_arrays(self) -> (np.array, np.array, np.array):
+        """
+        Unfilled tiles of rows with at least 2 blanks, meant for solvers (arrays must not be modified)
+        Indexes of unfilled tiles of row rows[i] are idx[offsets[i]:offsets[i + 1]]
+        :return: rows, idx, offsets
+        """
+        return self._unfilled_rows, self._unfilled_idx, self._unfilled_offsets
+
     def unfilled_by_row(self) -> dict:
         """
         :return: Dictionary with row numbers as keys and unfilled indexes as values
         """
-        return self._unfilled.copy()
+        offsets = self._unfilled_offsets.tolist()
+        idx = self._unfilled_idx.tolist()
+        return {row: idx[offsets[i]:offsets[i + 1]] for i, row in enumerate(self._unfilled_rows.tolist())}
 
     def unfilled_positions(self) -> list:
         """
@@ -84,9 +109,10 @@ class Board:
         """
         positions = []
         # iterate row numbers
-        for row in self._unfilled:
+        unfilled = self.unfilled_by_row()
+        for row in unfilled:
             # iterate indexes of the row
-            for index in self._unfilled[row]:
+            for index in unfilled[row]:
                 # add to the list
                 positions.append(Pos(x=index, y=row))
         return positions
@@ -97,6 +123,20 @@ class Board:
         """
         return self._board.copy()
 
+    def raw(self) -> np.array:
+        """
+        Direct access to the values, initial values are not protected
+        Meant for solvers which keep initial values untouched
+        :return: 2D array of all values (not a copy)
+        """
+        return self._board
+
+    def initial_mask(self) -> np.array:
+        """
+        :return: 2D array of flags, True where the value was set initially
+        """
+        return self._init_mask
+
     def at(self, pos: Pos):
         """
         :return: Value on given position, None when the position is out of bounds
@@ -117,7 +157,7 @@ class Board:
         """
         if not self.is_valid(pos):
             return False
-        return self._board_init[pos.y, pos.x] != 0
+        return self._init_mask[pos.y, pos.x]
 
     def fill_board(self, values: np.array):
         """
@@ -127,12 +167,9 @@ class Board:
         # check bounds
         if values.shape != (self._size, self._size):
             return False
-        # scan all tiles first
-        for line_init, line_new in zip(self._board_init, values):
-            for tile_init, tile_new in zip(line_init, line_new):
-                # check if any initial value was changed
-                if tile_init != 0 and tile_init != tile_new:
-                    return False
+        # check if any initial value was changed
+        if np.any(self._init_mask & (self._board_init != values)):
+            return False
         # initial values match
         self._board = values
         return True
@@ -145,13 +182,12 @@ class Board:
         # check bounds
         if len(values) != self._size or not (0 <= line_num < self._size):
             return False
-        # scan the line
-        for tile_init, tile_new in zip(self._board_init[line_num], values):
-            # check if any initial value was changed
-            if tile_init != 0 and tile_init != tile_new:
-                return False
+        # check if any initial value was changed
+        if np.any(self._init_mask[line_num] & (self._board_init[line_num] != values)):
+            return False
         # initial values match
         self._board[line_num] = values
+        return True
 
     def set(self, pos: Pos, val: int):
         """
@@ -163,6 +199,17 @@ class Board:
         self._board[pos.y, pos.x] = val
         return True
 
+    def swap(self, line_num: int, x_1: int, x_2: int):
+        """
+        Tries to swap two tiles within one line
+        :return: Success
+        """
+        if self._init_mask[line_num, x_1] or self._init_mask[line_num, x_2]:
+            return False
+        line = self._board[line_num]
+        line[x_1], line[x_2] = line[x_2], line[x_1]
+        return True
+
     def reset(self):
         """
         Resets the board to initial state
@@ -199,10 +246,10 @@ class Board:
         """
         :return: Shallow copy of the board
         """
-        b = Board(self._size, self._display_blank)
+        # skip the constructor, everything except the values is shared as it never changes
+        b = Board.__new__(Board)
+        b.__dict__.update(self.__dict__)
         b._board = self._board.copy()
-        b._board_init = self._board_init.copy()
-        b._unfilled = self._unfilled.copy()
         return b
 
     def _print_line(self, line: np.array):
@@ -252,24 +299,62 @@ class Board:
         """
         :return: Number of mistakes found, ratio
         """
-        mistakes = 0
-
-        # check rows
-        for row in self._board:
-            if not self._check_unique(row):
-                mistakes += 1
-        # check columns
-        for i in range(self._size):
-            col = self._board[:, i]
-            if not self._check_unique(col):
-                mistakes += 1
-        # check squares
-        for square in self.squares():
-            if not self._check_unique(square):
-                mistakes += 1
+        rows_ok, cols_ok, squares_ok = self.check_areas()
+        mistakes = 3 * self._size - int(np.count_nonzero(rows_ok) + np.count_nonzero(cols_ok)
+                                        + np.count_nonzero(squares_ok))
 
         return mistakes, mistakes / (3 * self._size)
 
+    def check_areas(self) -> (np.array, np.array, np.array):
+        """
+        Checks all areas, squares are indexed from top left to bottom right by rows
+        :return: arrays of flags (True when the area is ok according to sudoku rules) for rows, columns and squares
+        """
+        # area is ok only when each value is present exactly once
+        return tuple(masks == self._full_mask for masks in self.area_masks())
+
+    def area_masks(self) -> (np.array, np.array, np.array):
+        """
+        Represents each area as a bitmask of values present in it (bit i set <=> value i + 1 is present)
+        :return: masks of rows, masks of columns, masks of squares
+        """
+        bits = self._value_bits[self._board]
+        # rearrange the board so that each square is stored in one line
+        sq = self._size_sq
+        sq_bits = bits.reshape(sq, sq, sq, sq).swapaxes(1, 2).reshape(self._size, self._size)
+        return (np.bitwise_or.reduce(bits, axis=1),
+                np.bitwise_or.reduce(bits, axis=0),
+                np.bitwise_or.reduce(sq_bits, axis=1))
+
+    def count_missing(self) -> int:
+        """
+        Finer measure of mistakes than check(), each area contributes by number of values missing in it
+        :return: Number of values missing in all rows, columns and squares
+        """
+        masks = np.concatenate(self.area_masks())
+        return 3 * self._size * self._size - sum(mask.bit_count() for mask in masks.tolist())
+
+    def missing_in_areas(self) -> (list, list, list):
+        """
+        Squares are indexed from top left to bottom right by rows
+        :return: lists of numbers of values missing in each row, column and square
+        """
+        return tuple([self._size - mask.bit_count() for mask in masks.tolist()] for masks in self.area_masks())
+
+    def missing_in_column(self, index: int) -> int:
+        """
+        :return: Number of values missing in the column
+        """
+        return self._missing_in_area(self._board[:, index])
+
+    def missing_in_square(self, pos: Pos) -> int:
+        """
+        :return: Number of values missing in the square containing given position
+        """
+        y0 = pos.y - pos.y % self._size_sq
+        x0 = pos.x - pos.x % self._size_sq
+        return self._missing_in_area(self._board[y0:y0 + self._size_sq, x0:x0 + self._size_sq])
+
     def squares(self, flatten: bool = True):
         """
         Generator, produces all square constraint areas on the board
@@ -295,6 +380,12 @@ class Board:
         """
         :return: Board-supported printable version of the number
         """
+        return self._tile_strs[num]
+
+    def _center_number(self, num: int) -> str:
+        """
+        :return: Number centered to the width of the widest number on the board
+        """
         rest = self._max_digits - self._count_digits(num)
         return ' ' * ((rest + 1) // 2) + str(num) + ' ' * (rest // 2)
 
@@ -304,22 +395,16 @@ class Board:
         """
         return _SAMPLE_INIT_PATH + str(self._size) + _SAMPLE_INIT_FORMAT
 
-    @staticmethod
-    def _check_unique(area):
+    def _missing_in_area(self, area: np.array) -> int:
         """
         Checks area (set of of tiles) - lines, columns or squares
-        :return: True when the are is ok according to sudoku rules, otherwise False
-        """
-        # possibilities
-        free = set(range(1, len(area) + 1))
-        # go through all tiles, check for conflicts or unfilled tiles
-        for x in area:
-            if x == 0 or x not in free:
-                # x is invalid
-                return False
-            # x is valid, remove it from viable options
-            free.remove(x)
-        return True
+        :return: Number of values missing in the area, 0 when the area is ok according to sudoku rules
+        """
+        mask = 0
+        for x in area.ravel().tolist():
+            mask |= 1 << x
+        # blank sets the lowest bit which does not represent any value
+        return self._size - (mask >> 1).bit_count()
 
     @staticmethod
     def _count_digits(num: int) -> int:
@@ -328,15 +413,7 @@ class Board:
         :param num: number
         :return: number of digits
         """
-        # edge case
-        if num == 0:
-            return 1
-        # rest
-        rv = 0
-        while num > 0:
-            num //= 10
-            rv += 1
-        return rv
+        return len(str(num))
 
 
 
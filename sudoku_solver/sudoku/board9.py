@@ -0,0 +1,34 @@
+"""
+Routines specialized for the standard board of size 9
+Board dimensions are constants, so no generic size computations are needed
+"""
+import numpy as np
+
+SIZE = 9
+SIZE_SQ = 3
+# area is valid when all bits are set
+FULL_MASK = 0x1FF
+# bit representation of each value (blank maps to no bit)
+VALUE_BITS = np.array([0] + [1 << i for i in range(SIZE)], dtype=np.uint16)
+# number of set bits of each mask
+POPCOUNT = np.array([mask.bit_count() for mask in range(FULL_MASK + 1)])
+
+
+def area_masks9(values: np.array) -> np.array:
+    """
+    Represents each area as a bitmask of values present in it (bit i set <=> value i + 1 is present)
+    :param values: 2D array of values
+    :return: masks of all rows, columns and squares in one array
+    """
+    bits = VALUE_BITS[values]
+    return np.concatenate((np.bitwise_or.reduce(bits, axis=1),
+                           np.bitwise_or.reduce(bits, axis=0),
+                           np.bitwise_or.reduce(bits.reshape(SIZE_SQ, SIZE_SQ, SIZE_SQ, SIZE_SQ), axis=(1, 3)).ravel()))
+
+
+def count_missing9(values: np.array) -> int:
+    """
+    :param values: 2D array of values
+    :return: Number of values missing in all rows, columns and squares
+    """
+    return 3 * SIZE * SIZE - int(POPCOUNT[area_masks9(values)].sum())
@@ -1,10 +1,54 @@
+import hashlib
+import os
 import random
 from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
 
+from sudoku import board9
 from sudoku.board import Board, Pos
 
 INFINITY = float('inf')
+# number of steps random choices are drawn for at once
+RANDOM_CHUNK = 1024
+# number of steps between checks of the stop hook
+STOP_CHECK_INTERVAL = 4096
+# functions the compiled kernels module has to provide
+_KERNELS = ('seed', 'climb', 'beta_climb', 'source_hash')
+
+
+def kernels_source_hash() -> int:
+    """
+    :return: Hash of the source of numba kernels, it identifies the source ahead of time compiled kernels are built from
+    """
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '_climb_nb.py')
+    with open(path, 'rb') as f:
+        digest = hashlib.blake2b(f.read(), digest_size=8).digest()
+    return int.from_bytes(digest, 'little', signed=True)
+
+
+def _load_kernels():
+    """
+    :return: Module of compiled kernels, None if numba is not available
+    """
+    try:
+        # ahead of time compiled kernels (built by python -m sudoku._aot_build)
+        from sudoku import sudoku_nb
+        # kernels built from an older source are ignored
+        if all(hasattr(sudoku_nb, name) for name in _KERNELS) and sudoku_nb.source_hash() == kernels_source_hash():
+            return sudoku_nb
+    except ImportError:
+        pass
+    try:
+        # kernels are compiled on first use, compiled code is cached on disk
+        from sudoku import _climb_nb
+        return _climb_nb
+    except ImportError:
+        # numba is not available, solvers run in pure python
+        return None
+
+
+_climb_nb = _load_kernels()
 
 """
 Sudoku solution found by a solver
@@ -21,19 +65,38 @@ class _Solver:
     Represents any sudoku solver
     """
 
-    def __init__(self, board: Board, max_restarts: int, max_iter: int, stop_if_found: bool = False):
+    def __init__(self, board: Board, max_restarts: int, max_iter: int, stop_if_found: bool = False,
+                 workers: int = 1):
         """
         :type board: Sudoku board in initial state
         :type max_restarts: max number of restarts
         :param max_iter: Maximal number of iterations the solver runs
+        :param workers: Number of processes running the restarts (None for number of CPUs)
         """
         self._board = board
         self._max_iter = max_iter
         self._max_restarts = max_restarts
+        # optional function checked during climbs and between restarts, solving stops early when it returns True
+        self.check_stop = None
         self._stop_if_found = stop_if_found
+        self._workers = workers if workers is not None else os.cpu_count()
         # get size of the board
         self._board_size, _ = board.bounds()
+        # standard board has specialized evaluation
+        self._specialized = self._board_size == board9.SIZE
         self._results = []
+        # random number generator for vectorized operations
+        self._rng = np.random.default_rng()
+        # coordinates of modifiable tiles, they do not change during the solve
+        rows, idx, offsets = board.unfilled_arrays()
+        self._unfilled_y = np.repeat(rows, np.diff(offsets)).astype(np.intp)
+        self._unfilled_x = idx.astype(np.intp)
+        # modifiable rows and indexes of their unfilled tiles, cached for fast random access
+        unfilled = board.unfilled_by_row()
+        self._mod_rows = tuple(unfilled.keys())
+        self._mod_rows_idx = tuple(unfilled.values())
+        self._mod_rows_n = len(self._mod_rows)
+        self._mod_rows_len = np.diff(offsets)
 
     def try_solve(self):
         """
@@ -45,12 +108,38 @@ class _Solver:
         result = self._solve()
         return Solution(self._board, result)
 
+    def __getstate__(self) -> dict:
+        """
+        The stop hook is not sent to worker processes (it may not be picklable), the parent checks it
+        """
+        state = self.__dict__.copy()
+        state['check_stop'] = None
+        return state
+
     def all_results(self) -> list:
         """
         :return: List of all results from the previous solve run
         """
         return self._results.copy()
 
+    def config(self) -> tuple:
+        """
+        :return: Configuration which affects results of the solver
+        """
+        return type(self).__name__, self._max_restarts, self._max_iter, self._stop_if_found
+
+    def scores_array(self) -> np.array:
+        """
+        :return: Scores of all results from the previous solve run
+        """
+        return np.array([res.score for res in self._results], dtype=np.int32)
+
+    def iterations_array(self) -> np.array:
+        """
+        :return: Numbers of iterations of all results from the previous solve run
+        """
+        return np.array([res.iterations for res in self._results], dtype=np.int32)
+
     def _solve(self) -> Result:
         """
         Runs unspecified hill climbing algorithm many times to prevent local minimum problem
@@ -61,10 +150,12 @@ class _Solver:
         if len(self._board.unfilled_by_row()) == 0:
             # already solved
             return self._solve_trivial()
+        if self._workers > 1:
+            # restarts are independent, run them in parallel
+            return self._solve_parallel()
 
         best = None
-        score_min = INFINITY
-        itr_min = INFINITY
+        best_res = Result(INFINITY, INFINITY)
         # run hill climbing algorithm repeatedly
         for _ in range(self._max_restarts):
             # run hill climbing
@@ -77,21 +168,74 @@ class _Solver:
             # check if the final solution is found
             if self._stop_if_found and score == 0:
                 return res
-            # update best run
-            if score < score_min:
-                score_min = score
-                itr_min = itr
-                best = self._board.copy()
-            if score == score_min and itr < itr_min:
-                score_min = score
-                itr_min = itr
-                best = self._board.copy()
+            # update best run (lower score first, then fewer iterations)
+            if res < best_res:
+                best_res = res
+                best = self._board.values()
+            # stop requested from outside
+            if self.check_stop is not None and self.check_stop():
+                break
             # restart board for next run
             self._board.reset()
 
         # no perfect solution found
-        self._board = best
-        return Result(score_min, itr_min)
+        self._board.fill_board(best)
+        return best_res
+
+    def _solve_parallel(self) -> Result:
+        """
+        Runs restarts of the hill climbing algorithm in separate processes
+        :return Best result from all runs
+        """
+        best = None
+        best_res = Result(INFINITY, INFINITY)
+        # each restart gets its own random seed
+        seeds = np.random.SeedSequence().spawn(self._max_restarts)
+        chunk_size = max(1, self._max_restarts // (4 * self._workers))
+        executor = ProcessPoolExecutor(max_workers=self._workers)
+        try:
+            # results are collected in order of restarts
+            for res, values in executor.map(self._restart, seeds, chunksize=chunk_size):
+                self._results.append(res)
+                # check if the final solution is found
+                if self._stop_if_found and res.score == 0:
+                    self._board.fill_board(values)
+                    return res
+                # update best run (lower score first, then fewer iterations)
+                if res < best_res:
+                    best_res = res
+                    best = values
+                # stop requested from outside
+                if self.check_stop is not None and self.check_stop():
+                    break
+        finally:
+            # do not wait for restarts which are not needed anymore
+            executor.shutdown(cancel_futures=True)
+
+        self._board.fill_board(best)
+        return best_res
+
+    def _restart(self, seed: np.random.SeedSequence) -> (Result, np.array):
+        """
+        Runs one restart of the hill climbing algorithm, used by worker processes
+        :param seed: seed of random generators
+        :return: Result of the run, values of the board
+        """
+        self._seed(seed)
+        self._board.reset()
+        self._fill()
+        score, itr = self._climb()
+        return Result(score, itr), self._board.values()
+
+    def _seed(self, seed: np.random.SeedSequence):
+        """
+        Seeds all random generators used by the solver
+        """
+        state = int(seed.generate_state(1)[0])
+        random.seed(state)
+        self._rng = np.random.default_rng(seed)
+        if _climb_nb is not None:
+            _climb_nb.seed(state)
 
     def _solve_trivial(self) -> Result:
         """
@@ -107,21 +251,67 @@ class _Solver:
         :return: Score of the best solution
         """
         score_min = self._eval(self._board)
+        # steps are performed on a scratch board, it is swapped with the current one when the step is accepted
+        current, scratch = self._board, self._board.copy()
         # keep climbing until max number of iterations is reached
         for i in range(self._max_iter):
+            if i % STOP_CHECK_INTERVAL == 0 and self._stop_requested():
+                self._keep_state(current)
+                return score_min, i
             # perform next step on a copy of the board
-            board_copy = self._board.copy()
-            self._step(board_copy)
-            score = self._eval(board_copy)
+            np.copyto(scratch.raw(), current.raw())
+            self._step(scratch)
+            score = self._eval(scratch)
             # update best result
             if score <= score_min:
                 score_min = score
-                self._board = board_copy
+                current, scratch = scratch, current
                 # check if the solution was found
                 if score == 0:
+                    self._keep_state(current)
                     return 0, i + 1
+        self._keep_state(current)
         return score_min, self._max_iter
 
+    def _stop_requested(self) -> bool:
+        """
+        :return: True if the stop hook requests to stop solving
+        """
+        return self.check_stop is not None and self.check_stop()
+
+    def _climb_compiled(self, kernel, *args) -> (int, int):
+        """
+        Runs compiled climbing kernel on the board
+        When the stop hook is set, the kernel runs in slices of STOP_CHECK_INTERVAL iterations and the hook is checked
+        between them
+        :param kernel: Compiled climb, called as kernel(board, rows, indexes, offsets, *args, max_iter)
+        :return: Score of the best solution, number of iterations
+        """
+        # marshal the board into raw arrays
+        b = np.ascontiguousarray(self._board.raw(), dtype=np.int8)
+        rows, idx, offsets = self._board.unfilled_arrays()
+        # climb
+        if self.check_stop is None:
+            score, itr = kernel(b, rows, idx, offsets, *args, self._max_iter)
+        else:
+            itr = 0
+            while True:
+                score, done = kernel(b, rows, idx, offsets, *args, min(STOP_CHECK_INTERVAL, self._max_iter - itr))
+                itr += done
+                if score == 0 or itr >= self._max_iter or self.check_stop():
+                    break
+        # update the board
+        self._board.raw()[:] = b
+        return score, itr
+
+    def _keep_state(self, current: Board):
+        """
+        Copies the final state of a climb to the solved board (climbs may end on a scratch board)
+        :param current: Board holding the final state
+        """
+        if current is not self._board:
+            np.copyto(self._board.raw(), current.raw())
+
     def _fill_board_unique(self):
         """
         Fills the board with numbers so that all values are evenly distributed
@@ -140,28 +330,41 @@ class _Solver:
         :param line: Line to be filled
         :return: Filled line
         """
-        pool = list(range(1, self._board_size + 1))
-        # remove taken numbers from the pool
-        for tile in line:
-            if tile != 0:
-                pool.remove(tile)
-        # shuffle the rest
-        random.shuffle(pool)
+        # pool consists of numbers which are not present in the line
+        present = np.zeros(self._board_size + 1, dtype=bool)
+        present[line] = True
+        pool = np.flatnonzero(~present[1:]) + 1
+        # shuffle the pool
+        self._rng.shuffle(pool)
         # fill blanks with numbers from the pool
-        return [x if x != 0 else pool.pop() for x in line]
+        filled = line.copy()
+        filled[line == 0] = pool
+        return filled
 
-    @staticmethod
-    def _swap_in_line(line: np.array, viable):
+    @classmethod
+    def _swap_in_line(cls, line: np.array, viable):
         """
         Swaps two fields in a line
         :param line: line of numbers
         :param viable: indexes of numbers which can be swapped
         """
         # pick two tiles from the line
-        sample = random.sample(viable, 2)
+        a, b = cls._pick_two(len(viable))
+        i, j = viable[a], viable[b]
         # swap their position in the original board
-        val_1, val_2 = line[sample[0]], line[sample[1]]
-        line[sample[0]], line[sample[1]] = val_2, val_1
+        line[i], line[j] = line[j], line[i]
+
+    @staticmethod
+    def _pick_two(num: int) -> (int, int):
+        """
+        :return: Two different random numbers from interval <0; num)
+        """
+        a = random.randrange(num)
+        b = random.randrange(num - 1)
+        # skip a
+        if b >= a:
+            b += 1
+        return a, b
 
     @staticmethod
     def _count_unfilled(area):
@@ -177,13 +380,13 @@ class _Solver:
                 unfilled.append(i)
         return num, unfilled
 
-    @staticmethod
-    def _count_mistakes(board: Board):
+    def _count_mistakes(self, board: Board):
         """
-        :return: Number of mistakes on the board
+        :return: Number of mistakes on the board (values missing in all rows, columns and squares)
         """
-        mistakes_num, _ = board.check()
-        return mistakes_num
+        if self._specialized:
+            return board9.count_missing9(board.raw())
+        return board.count_missing()
 
 
 class HillClimbing(_Solver):
@@ -198,22 +401,85 @@ class HillClimbing(_Solver):
         """
         self._fill_board_unique()
 
-    def _step(self, board: Board) -> Board:
+    def _climb(self) -> (int, int):
         """
-        Performs one hill climb step
-        :param board: Current state of the board to step from
-        :return: Board after the step
+        Hill climbing algorithm, runs compiled version when numba is available
+        :return: Score of the best solution
         """
-        # select random line from unfilled ones
-        unfilled = board.unfilled_by_row()
-        row = list(unfilled.keys())[random.randint(0, len(unfilled) - 1)]
-        line = board.values()[row]
-        # swap 2 characters in it
-        self._swap_in_line(line, unfilled[row])
-        # update original board
-        board.fill_line(row, line)
+        if _climb_nb is None:
+            return self._climb_delta()
+        return self._climb_compiled(_climb_nb.climb)
 
-        return board
+    def _climb_delta(self) -> (int, int):
+        """
+        Hill climbing algorithm, evaluates only areas affected by each step and modifies the board in place
+        :return: Score of the best solution
+        """
+        # missing values in all columns and squares, updated after each step (rows can not change)
+        _, cols_missing, squares_missing = self._board.missing_in_areas()
+        score_min = self._eval(self._board)
+        steps = iter(())
+        # keep climbing until max number of iterations is reached
+        for i in range(self._max_iter):
+            if i % STOP_CHECK_INTERVAL == 0 and self._stop_requested():
+                return score_min, i
+            if i % RANDOM_CHUNK == 0:
+                # draw random choices for following steps at once
+                steps = self._draw_steps(min(RANDOM_CHUNK, self._max_iter - i))
+            # swap two tiles from random line from unfilled ones
+            r, a, b = next(steps)
+            row, viable = self._mod_rows[r], self._mod_rows_idx[r]
+            x_1, x_2 = viable[a], viable[b]
+            self._board.swap(row, x_1, x_2)
+            # keep the swap only when the state does not get worse
+            delta, changes = self._eval_delta(self._board, row, x_1, x_2, cols_missing, squares_missing)
+            if delta <= 0:
+                for areas_missing, index, missing in changes:
+                    areas_missing[index] = missing
+                score_min += delta
+                # check if the solution was found
+                if score_min == 0:
+                    return 0, i + 1
+            else:
+                self._board.swap(row, x_1, x_2)
+        return score_min, self._max_iter
+
+    def _draw_steps(self, num: int):
+        """
+        Draws random choices of multiple steps at once
+        :param num: number of steps
+        :return: Iterator of (index of modifiable row, index of first tile, index of second tile) in the row
+        """
+        rows = self._rng.integers(0, self._mod_rows_n, size=num)
+        lengths = self._mod_rows_len[rows]
+        # two different tiles from each row
+        first = (self._rng.random(num) * lengths).astype(np.intp)
+        second = (self._rng.random(num) * (lengths - 1)).astype(np.intp)
+        second += second >= first
+        return zip(rows.tolist(), first.tolist(), second.tolist())
+
+    @staticmethod
+    def _eval_delta(board: Board, row: int, x_1: int, x_2: int,
+                    cols_missing: list, squares_missing: list) -> (int, list):
+        """
+        Evaluates change of the heuristic caused by swapping two tiles within a row
+        Row itself can not change, so only affected columns and squares are checked
+        :param board: board after the swap
+        :param cols_missing: missing values in columns before the swap
+        :param squares_missing: missing values in squares before the swap
+        :return: Difference between new and previous evaluation score, list of (areas, index, new missing values)
+        """
+        _, size_sq = board.bounds()
+        sq_1 = row // size_sq * size_sq + x_1 // size_sq
+        sq_2 = row // size_sq * size_sq + x_2 // size_sq
+        changes = [(cols_missing, x_1, board.missing_in_column(x_1)),
+                   (cols_missing, x_2, board.missing_in_column(x_2)),
+                   (squares_missing, sq_1, board.missing_in_square(Pos(x=x_1, y=row)))]
+        # both tiles can share one square
+        if sq_1 != sq_2:
+            changes.append((squares_missing, sq_2, board.missing_in_square(Pos(x=x_2, y=row))))
+        delta = sum(missing - areas_missing[index] for areas_missing, index, missing in changes)
+        return delta, changes
 
     def _eval(self, board: Board):
         """
@@ -233,43 +499,42 @@ class _BetaHC(_Solver):
     https://www.bau.edu.jo/UserPortal/UserProfile/PostsAttach/98216_992_1.pdf
     """
 
-    def __init__(self, board: Board, max_restarts: int, max_iter: int, n, beta, stop_if_found: bool = False):
+    def __init__(self, board: Board, max_restarts: int, max_iter: int, n, beta, stop_if_found: bool = False,
+                 workers: int = 1):
         """
         :type board: Sudoku board in initial state
         :type max_restarts: max number of restarts
         :param max_iter: Maximal number of iterations the solver runs
         :type n: probability of exploiting a tile
         :param beta: probability of tile mutation
+        :param workers: Number of processes running the restarts (None for number of CPUs)
         """
-        super(_BetaHC, self).__init__(board, max_restarts, max_iter, stop_if_found)
+        super(_BetaHC, self).__init__(board, max_restarts, max_iter, stop_if_found, workers)
         self._n_prob = n
         self._beta_prob = beta
 
-    def _generate_fill_number(self) -> int:
+    def config(self) -> tuple:
         """
-        :return: Random number to be placed on a blank spot
+        :return: Configuration which affects results of the solver
         """
-        return random.randint(1, self._board_size)
+        return super(_BetaHC, self).config() + (self._n_prob, self._beta_prob)
 
-    def _step(self, board: Board) -> Board:
+    def _generate_fill_number(self) -> int:
         """
-        Performs one ß-hill-climb step
-        :param board: Current state of the board to step from
-        :return: Board after the step
+        :return: Random number to be placed on a blank spot
         """
-        # run n-operator and ß-operator on the board
-        board = self._neighbouring_operator(board)
-        board = self._beta_operator(board)
-
-        return board
+        return random.randint(1, self._board_size)
 
-    @staticmethod
-    def _with_probability(prob: float):
+    def _select_with_probability(self, prob: float, num: int) -> (np.array, np.array):
         """
-        :return: True with probability of 'prob', otherwise False
+        Selects each of 'num' items with probability of 'prob'
+        :return: Indexes of selected items,
+        their random draws scaled to interval <0; 1) (usable as another random number)
         """
         assert 0 <= prob <= 1, 'Probability must be a number from interval <0; 1>'
-        return random.random() <= prob
+        draws = self._rng.random(num)
+        idx = np.flatnonzero(draws < prob)
+        return idx, draws[idx] / prob
 
 
 class PaperBetaHC(_BetaHC):
@@ -281,11 +546,40 @@ class PaperBetaHC(_BetaHC):
     https://www.researchgate.net/publication/319886025_b-Hill_Climbing_Algorithm_for_Sudoku_Game
     """
 
+    def __init__(self, board: Board, max_restarts: int, max_iter: int, n, beta, stop_if_found: bool = False,
+                 workers: int = 1):
+        """
+        :type board: Sudoku board in initial state
+        :type max_restarts: max number of restarts
+        :param max_iter: Maximal number of iterations the solver runs
+        :type n: probability of exploiting a tile
+        :param beta: probability of tile mutation
+        :param workers: Number of processes running the restarts (None for number of CPUs)
+        """
+        super(PaperBetaHC, self).__init__(board, max_restarts, max_iter, n, beta, stop_if_found, workers)
+        _, size_sq = board.bounds()
+        # each area should sum up to 1 + 2 + .. + size
+        self._target = self._board_size * (self._board_size + 1) // 2
+        # areas containing each modifiable tile (row, column and square), indexed as in _area_sums
+        squares = self._unfilled_y // size_sq * size_sq + self._unfilled_x // size_sq
+        self._tile_areas = list(zip(self._unfilled_y.tolist(),
+                                    (self._board_size + self._unfilled_x).tolist(),
+                                    (2 * self._board_size + squares).tolist()))
+        # sums of all areas and their total deviation from the target, updated after each accepted step
+        self._sums = []
+        self._dev_sum = 0
+        # neighbouring values of each value (lowered, raised), kept within bounds
+        values = np.arange(self._board_size + 1)
+        self._neighbours = np.stack((np.maximum(values - 1, 1), np.minimum(values + 1, self._board_size)), axis=1)
+
     def _fill(self):
         """
         Fills empty spaces on the board
         """
         self._fill_board_random()
+        sums = self._area_sums(self._board.values())
+        self._sums = sums.tolist()
+        self._dev_sum = int(np.abs(self._target - sums).sum())
 
     def _fill_board_random(self):
         """
@@ -301,93 +595,126 @@ class PaperBetaHC(_BetaHC):
                     new_val = self._generate_fill_number()
                     self._board.set(pos=p, val=new_val)
 
-    def _eval(self, board: Board):
+    def _area_sums(self, values: np.array) -> np.array:
         """
-        Acts as an heuristic, evaluates current state of the board
-        The lower, the better
-        :param board: board to be evaluated
-        :return: Evaluation score, ideal is 0
+        :param values: 2D array of values
+        :return: Sums of all rows, columns and squares in one array
         """
-        return self._objective(board)
+        size_sq = int(np.sqrt(self._board_size))
+        return np.concatenate((values.sum(axis=1),
+                               values.sum(axis=0),
+                               values.reshape(size_sq, size_sq, size_sq, size_sq).sum(axis=(1, 3)).ravel()))
 
-    def _objective(self, board: Board):
+    def _climb(self) -> (int, int):
         """
-        Objective operator
-        Acts as an heuristic, its value represents deviation from the solution)
-        The lower the better, ideal value is 0
-        :type board: proposed solution
-        :return: Heuristic value for the board
+        Hill climbing algorithm, modifies the board in place
+        Area sums are updated from tiles written by each step, only areas containing them are evaluated
+        :return: Score of the best solution
         """
-        values = board.values()
-        dev_sum = 0
-        # rows
-        for row in values:
-            dev_sum += self._eval_tiles(row)
-        # columns
-        for i in range(self._board_size):
-            col = values[:, i]
-            dev_sum += self._eval_tiles(col)
-        # squares
-        for square in board.squares():
-            dev_sum += self._eval_tiles(square)
+        # keep climbing until max number of iterations is reached
+        for i in range(self._max_iter):
+            if i % STOP_CHECK_INTERVAL == 0 and self._stop_requested():
+                return self._dev_sum, i
+            steps = self._step(self._board)
+            delta, changes = self._eval_delta(steps)
+            # update best result
+            if delta <= 0:
+                self._dev_sum += delta
+                for area, change in changes.items():
+                    self._sums[area] += change
+                # check if the solution was found
+                if self._dev_sum == 0:
+                    return 0, i + 1
+            else:
+                # worse state, undo the step
+                self._undo(self._board, steps)
+        return self._dev_sum, self._max_iter
 
-        return dev_sum
+    def _step(self, board: Board) -> list:
+        """
+        Performs one ß-hill-climb step directly on the board
+        :param board: Current state of the board to step from
+        :return: Tiles written by each operator, list of (indexes of modifiable tiles, old values, new values)
+        """
+        # run n-operator and ß-operator on the board
+        return [self._neighbouring_operator(board), self._beta_operator(board)]
 
-    @staticmethod
-    def _eval_tiles(tiles: np.array) -> int:
+    def _undo(self, board: Board, steps: list):
+        """
+        Restores values overwritten by the step, in reverse order
+        :param board: Board after the step
+        :param steps: Tiles written by each operator of the step
+        """
+        values = board.raw()
+        for idx, old, _ in reversed(steps):
+            values[self._unfilled_y[idx], self._unfilled_x[idx]] = old
+
+    def _eval_delta(self, steps: list) -> (int, dict):
         """
-        Helper for the objective function
-        :param tiles: tiles to count the summary of
-        :return: Deviation
+        Evaluates the step from tiles it has written
+        :param steps: Tiles written by each operator of the step
+        :return: Change of the objective, changes of sums of touched areas
         """
-        return abs(45 - np.sum(tiles))
+        # add differences of written tiles to their row, column and square
+        changes = {}
+        for idx, old, new in steps:
+            for k, old_val, new_val in zip(idx.tolist(), old.tolist(), new.tolist()):
+                diff = new_val - old_val
+                if diff:
+                    for area in self._tile_areas[k]:
+                        changes[area] = changes.get(area, 0) + diff
+        # only touched areas change their deviation
+        delta = 0
+        for area, change in changes.items():
+            area_sum = self._sums[area]
+            delta += abs(self._target - area_sum - change) - abs(self._target - area_sum)
+        return delta, changes
 
-    def _neighbouring_operator(self, board: Board):
+    def _neighbouring_operator(self, board: Board) -> (np.array, np.array, np.array):
         """
         N-operator of the ß-climbing, introduces exploitation to the algorithm
+        Modifies the board directly
         :param board: State of the board
-        :return: Neighbouring state
+        :return: Indexes of modified tiles (within modifiable ones), their old values, their new values
         """
-        values = board.values()
+        values = board.raw()
 
-        # iterate modifiable tiles
-        for pos in board.unfilled_positions():
-            # modify the tile if it meets the probability of n
-            if self._with_probability(self._n_prob):
-                values[pos.y, pos.x] = self._neighbouring_val(values[pos.y, pos.x])
-        # fill the board
-        board.fill_board(values)
+        # select modifiable tiles which meet the probability of n
+        idx, draws = self._select_with_probability(self._n_prob, len(self._unfilled_y))
+        ys, xs = self._unfilled_y[idx], self._unfilled_x[idx]
+        old = values[ys, xs]
+        # lower or raise the value with the same probability
+        new = self._neighbouring_val(old, draws >= 0.5)
+        values[ys, xs] = new
 
-        return board
+        return idx, old, new
 
-    def _neighbouring_val(self, val):
+    def _neighbouring_val(self, vals: np.array, raise_flags: np.array) -> np.array:
         """
-        :return: Neighbouring value (either lower by 1 or higher by 1)
+        :param vals: Values to be changed
+        :param raise_flags: Flags whether each value is raised (or lowered)
+        :return: Neighbouring values (each either lower by 1 or higher by 1)
         Handles both over-flow and under-flow
         """
-        if self._with_probability(0.5):
-            # add 1 (except for UB)
-            return val + 1 if val != self._board_size else val
-        else:
-            # subtract 1 (except for LB)
-            return val - 1 if val != 1 else 1
+        return self._neighbours[vals, raise_flags.astype(np.intp)]
 
-    def _beta_operator(self, board: Board):
+    def _beta_operator(self, board: Board) -> (np.array, np.array, np.array):
         """
         ß-operator of the ß-climbing, introduces exploration to the algorithm
+        Modifies the board directly
         :param board: Neighbouring state of the board
-        :return: New state of the board
+        :return: Indexes of regenerated tiles (within modifiable ones), their old values, their new values
         """
-        values = board.values()
-        # scan the board
-        for pos in board.unfilled_positions():
-            # regenerate the value if it meets the probability of beta
-            if self._with_probability(self._beta_prob):
-                values[pos.y, pos.x] = self._generate_fill_number()
-        # fill the board
-        board.fill_board(values)
+        values = board.raw()
+        # select modifiable tiles which meet the probability of beta
+        idx, draws = self._select_with_probability(self._beta_prob, len(self._unfilled_y))
+        ys, xs = self._unfilled_y[idx], self._unfilled_x[idx]
+        old = values[ys, xs]
+        # draws are uniform, they give uniformly distributed new values
+        new = (draws * self._board_size).astype(np.intp) + 1
+        values[ys, xs] = new
 
-        return board
+        return idx, old, new
 
 
 class CustomBetaHC(_BetaHC):
@@ -410,46 +737,40 @@ class CustomBetaHC(_BetaHC):
         """
         return self._count_mistakes(board)
 
-    def _neighbouring_operator(self, board: Board):
+    def _climb(self) -> (int, int):
         """
-        N-operator of the ß-climbing, introduces exploitation to the algorithm
-        :param board: State of the board
-        :return: Neighbouring state
+        ß-hill climbing algorithm, runs compiled version when numba is available
+        :return: Score of the best solution
         """
-        values = board.values()
+        assert 0 <= self._n_prob <= 1 and 0 <= self._beta_prob <= 1, \
+            'Probability must be a number from interval <0; 1>'
+        if _climb_nb is None:
+            return super(CustomBetaHC, self)._climb()
+        return self._climb_compiled(_climb_nb.beta_climb, self._n_prob, self._beta_prob)
 
-        # iterate rows
-        unfilled = board.unfilled_by_row()
-        for row in unfilled:
-            # only modify the rows when they meet the probability of n
-            if self._with_probability(self._n_prob):
-                # swap 2 tiles
-                self._swap_in_line(values[row], unfilled[row])
-        # update original board
-        board.fill_board(values)
-
-        return board
-
-    def _beta_operator(self, board: Board):
+    def _step(self, board: Board) -> Board:
         """
-        ß-operator of the ß-climbing, introduces exploration to the algorithm
-        :param board: Neighbouring state of the board
-        :return: New state of the board
+        Performs one ß-hill-climb step
+        Both operators are applied in a single pass over modifiable rows:
+        n-operator swaps 2 tiles in the row with probability of n (exploitation),
+        ß-operator regenerates the row with probability of beta (exploration), it overrides the n-operator
+        :param board: Current state of the board to step from
+        :return: Board after the step
         """
-        # go through modifiable rows
-        unfilled = board.unfilled_by_row()
-        for row in unfilled:
-            # regenerate the row with probability of beta
-            if self._with_probability(self._beta_prob):
-                line = board.values()[row]
-                # clear
-                for index in unfilled[row]:
-                    line[index] = 0
-                # refill
-                board.fill_line(row, np.array(self._fill_line_unique(line)))
+        values = board.raw()
+        # probability of the row being swapped or regenerated
+        modify_prob = self._beta_prob + self._n_prob * (1 - self._beta_prob)
+
+        # one random draw decides which operator modifies the row
+        draws = self._rng.random(self._mod_rows_n).tolist()
+        for row, viable, draw in zip(self._mod_rows, self._mod_rows_idx, draws):
+            if draw < self._beta_prob:
+                # regenerate the row
+                line = values[row]
+                line[viable] = 0
+                line[:] = self._fill_line_unique(line)
+            elif draw < modify_prob:
+                # swap 2 tiles
+                self._swap_in_line(values[row], viable)
 
         return board
-
-
-
-
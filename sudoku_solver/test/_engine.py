@@ -2,63 +2,185 @@
 Functions for time performance testing
 """
 
+import gc
+import hashlib
+import multiprocessing
+import os
+import sys
+import tempfile
 import time
-from collections import namedtuple
+import timeit
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+from functools import cache, partial
+from itertools import repeat
+
+import numpy as np
 
 INFINITY = float('inf')
 NAN = float('nan')
 
+# persistent cache of solver results
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.sudoku_bench_cache')
+# max number of cached results, least recently used are removed
+CACHE_SIZE = 256
+# bumped when format of cached results changes
+CACHE_VERSION = 1
+
+# stop flag shared by worker processes racing for the same solution
+_race_stop = None
 
-def test_time_perfect(solver, runs: int = 1):
+
+def test_time_perfect(solver_factory, runs: int = 1, workers: int = 1, budget_ns: int = 60_000_000_000,
+                      race: bool = False):
     """
     Tests time performance of an algorithm when finding perfect solution
-    :param solver: Hill climbing algorithm to be tested
+    Runs exceeding the time budget are given up, their time is infinite
+    Garbage collection is paused during measurements
+    :param solver_factory: Picklable function creating the hill climbing algorithm to be tested
     :param runs: Number of times to find the solution
-    :return: best time, worst time, average time, total time
+    :param workers: Number of processes running the measurements (None for number of CPUs)
+    :param budget_ns: Time budget of one run in nanoseconds
+    :param race: All workers race in each run, its time is the time to the first solution
+    :return: best time, worst time, average time, total time (in nanoseconds)
     """
     assert runs >= 1
 
-    time_sum = 0
-    time_min = INFINITY
-    time_max = -INFINITY
-    for _ in range(runs):
-        time_curr = 0
-        # keep running the algorithm until perfect solution is found
+    run = partial(_time_perfect_run, budget_ns=budget_ns)
+    results = _race_runs(run, solver_factory, runs, workers) if race else _map_runs(run, solver_factory, runs, workers)
+    # collect times of finished runs, stats are reduced at the end
+    times = array('q', (t for t in results if t != INFINITY))
+    if len(times) == 0:
+        return INFINITY, INFINITY, INFINITY, INFINITY
+
+    # average and total time skip runs which were given up
+    time_sum = sum(times)
+    time_max = max(times) if len(times) == runs else INFINITY
+    return min(times), time_max, time_sum / len(times), time_sum
+
+
+def test_time_separate(solver_factory, runs, workers: int = 1):
+    """
+    Tests time performance of an algorithm when finding perfect solution
+    Each measurement repeats the algorithm so that it takes at least 0.2s (as timeit does)
+    Garbage collection is paused during measurements
+    :param solver_factory: Picklable function creating the hill climbing algorithm to be tested
+    :param runs: Number of measurements
+    :param workers: Number of processes running the measurements (None for number of CPUs)
+    :return: best time, worst time, average time of one run, total time (in nanoseconds)
+    """
+    # number of runs in one measurement
+    number, _ = timeit.Timer(solver_factory().try_solve).autorange()
+
+    # collect times of all measurements, stats are reduced at the end
+    times = array('q', _map_runs(partial(_time_separate_run, number=number), solver_factory, runs, workers))
+    time_sum = sum(times)
+    return min(times) // number, max(times) // number, time_sum / (runs * number), time_sum
+
+
+def _map_runs(run, solver_factory, runs: int, workers: int):
+    """
+    Repeats the measurement, runs are distributed among processes if there are more workers
+    :param run: Measurement, takes the solver factory and returns time of the run
+    :param solver_factory: Picklable function creating the solver
+    :param runs: Number of runs
+    :param workers: Number of processes running the measurements (None for number of CPUs)
+    :return: Iterable of times of all runs
+    """
+    workers = workers if workers is not None else os.cpu_count()
+    if workers == 1:
+        return (run(solver_factory) for _ in range(runs))
+
+    chunk_size = max(1, runs // (4 * workers))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(run, repeat(solver_factory, runs), chunksize=chunk_size))
+
+
+def _race_runs(run, solver_factory, runs: int, workers: int):
+    """
+    Repeats the measurement, all workers race in each run and the first one to finish stops the others
+    :param run: Measurement, takes the solver factory and returns time of the run
+    :param solver_factory: Picklable function creating the solver
+    :param runs: Number of runs
+    :param workers: Number of processes running the measurements (None for number of CPUs)
+    :return: Times of all runs (time of the winner)
+    """
+    workers = workers if workers is not None else os.cpu_count()
+    stop = multiprocessing.Event()
+    times = []
+    # the flag can be shared only when processes are created
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_race_worker, initargs=(stop,)) as executor:
+        for _ in range(runs):
+            stop.clear()
+            futures = [executor.submit(run, solver_factory) for _ in range(workers)]
+            times.append(min(future.result() for future in futures))
+    return times
+
+
+def _init_race_worker(stop):
+    """
+    Initializes worker process racing with others
+    :param stop: Flag set by the first worker which finds the solution
+    """
+    global _race_stop
+    _race_stop = stop
+
+
+def _time_perfect_run(solver_factory, budget_ns: int) -> int:
+    """
+    Keeps running the algorithm until perfect solution is found
+    When racing with other workers, the run is given up once any of them finds the solution
+    :param solver_factory: Function creating the solver
+    :param budget_ns: Time budget of the run in nanoseconds
+    :return: Time it took in nanoseconds, INFINITY if the budget was exceeded or the race was lost
+    """
+    solver = solver_factory()
+    if _race_stop is not None:
+        solver.check_stop = _race_stop.is_set
+    time_curr = 0
+    with _gc_paused():
         while True:
+            # another worker already found the solution
+            if _race_stop is not None and _race_stop.is_set():
+                return INFINITY
             # measure the time
             solution, tmp = _measure_time(solver.try_solve)
             time_curr += tmp
+            if time_curr > budget_ns:
+                return INFINITY
             if solution.result.score == 0:
-                break
-        # update stats
-        time_sum += time_curr
-        time_min = time_curr if time_curr < time_min else time_min
-        time_max = time_curr if time_curr > time_max else time_max
-
-    # count average time, set to INF if there is no perfect solution
-    time_avg = time_sum / runs if time_min != INFINITY else INFINITY
-    return time_min, time_max, time_avg, time_sum
+                if _race_stop is not None:
+                    _race_stop.set()
+                return time_curr
 
 
-def test_time_separate(solver, runs):
+def _time_separate_run(solver_factory, number: int = 1) -> int:
     """
-    Tests time performance of an algorithm when finding perfect solution
-    :param solver: Hill climbing algorithm to be tested
-    :param runs: Number of times to restart the algorithm
-    :return: best time, worst time, average time, total time
+    Runs the algorithm repeatedly
+    :param solver_factory: Function creating the solver
+    :param number: Number of runs
+    :return: Time of all runs in nanoseconds
     """
-    time_min = INFINITY
-    time_max = -INFINITY
-    time_sum = 0
-    for _ in range(runs):
-        # measure time
-        _, time_curr = _measure_time(solver.try_solve)
-        # update stats
-        time_sum += time_curr
-        time_min = time_curr if time_curr < time_min else time_min
-        time_max = time_curr if time_curr > time_max else time_max
+    solver = solver_factory()
+    with _gc_paused():
+        return timeit.Timer(solver.try_solve, timer=time.perf_counter_ns).timeit(number)
 
-    return time_min, time_max, time_sum / runs, time_sum
+
+@contextmanager
+def _gc_paused():
+    """
+    Collects garbage and disables garbage collection, so that it does not fire during measurements
+    """
+    enabled = gc.isenabled()
+    gc.collect()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
 
 
 def _measure_time(f, *args, **kwargs):
@@ -67,47 +189,146 @@ def _measure_time(f, *args, **kwargs):
     :param f: function
     :param args: function args
     :param kwargs: function kwargs
-    :return: return value of f, execution time
+    :return: return value of f, execution time in nanoseconds
     """
-    start = time.time()
+    start = time.perf_counter_ns()
     # run function
     rv = f(*args, **kwargs)
     # count time
-    return rv, time.time() - start
+    return rv, time.perf_counter_ns() - start
 
 
-"""
-Analysis of an algorithm run
-accuracy: Ratio of perfect results (between 0 and 1) 
-itr_avg: Average number of iterations it took to reach perfect solution
-itr_min: Minimal number of iterations it took to reach perfect solution
-itr_max: Maximal number of iterations it took to reach perfect solution
-itr_list: Sorted list of iterations of all results
-"""
-RunAnalysis = namedtuple('RunAnalysis', 'accuracy itr_avg itr_min itr_max itr_list')
+@dataclass(slots=True, frozen=True)
+class RunAnalysis:
+    """
+    Analysis of an algorithm run
+    accuracy: Ratio of perfect results (between 0 and 1)
+    itr_avg: Average number of iterations it took to reach perfect solution
+    itr_min: Minimal number of iterations it took to reach perfect solution
+    itr_max: Maximal number of iterations it took to reach perfect solution
+    itr_list: Not computed (None), kept for compatibility
+    Iteration stats are NAN if there is no perfect result
+    """
+    accuracy: float
+    itr_avg: int
+    itr_min: int
+    itr_max: int
+    itr_list: list = None
 
 
-def analyze_solver(solver) -> RunAnalysis:
+def analyze_solver(solver, cache_key: str = None) -> RunAnalysis:
     """
     Analyzes separate results of each start of a sudoku solver
     :param solver: Sudoku solver algorithm
+    :param cache_key: Key of the results in the persistent cache (None to always solve)
     :return: Analysis of the algorithm
     """
-    solver.try_solve()
-    results = solver.all_results()
+    scores, iterations = _solve_results(solver, cache_key)
 
-    # count analysis stuff
-    perfect = [x.iterations for x in results if x.score == 0]
-    # sort all perfect results from the run by iterations
-    perfect.sort()
-    accuracy = len(perfect) / len(results)
-    itr_avg = int(sum(perfect) / len(perfect)) if len(perfect) != 0 else NAN
-    itr_min = perfect[0] if len(perfect) > 0 else NAN
-    itr_max = perfect[-1] if len(perfect) > 0 else NAN
+    # count analysis stuff, perfect results do not need to be sorted
+    perfect = iterations[scores == 0]
+    n = perfect.size
+    accuracy = n / scores.size
+    if n:
+        itr_avg = int(perfect.sum() / n)
+        itr_min = int(perfect.min())
+        itr_max = int(perfect.max())
+    else:
+        itr_avg = itr_min = itr_max = NAN
 
     # compose return value
-    return RunAnalysis(accuracy, itr_avg, itr_min, itr_max, perfect)
+    return RunAnalysis(accuracy=accuracy, itr_avg=itr_avg, itr_min=itr_min, itr_max=itr_max, itr_list=None)
 
 
+def cache_key(board, solver) -> str:
+    """
+    :param board: Board solved by the solver
+    :param solver: Sudoku solver algorithm
+    :return: Key of the solver results in the persistent cache
+    """
+    # initial tiles never change, so the initial state can be recovered from any state of the board
+    initial = board.values() * board.initial_mask()
+    h = hashlib.blake2b(initial.tobytes(), digest_size=16)
+    h.update(repr(solver.config()).encode())
+    # results are invalidated whenever the solver code changes
+    h.update(_code_version(type(solver).__module__).encode())
+    return h.hexdigest()
+
+
+@cache
+def _code_version(module_name: str) -> str:
+    """
+    :param module_name: Name of a module
+    :return: Hash of sources of the package containing the module
+    """
+    package_dir = os.path.dirname(os.path.abspath(sys.modules[module_name].__file__))
+    h = hashlib.blake2b(str(CACHE_VERSION).encode(), digest_size=16)
+    for name in sorted(os.listdir(package_dir)):
+        if name.endswith('.py'):
+            with open(os.path.join(package_dir, name), 'rb') as f:
+                h.update(f.read())
+    return h.hexdigest()
 
 
+def _solve_results(solver, cache_key: str = None) -> (np.array, np.array):
+    """
+    Solves the sudoku, results are loaded from the cache if they are already computed
+    :param solver: Sudoku solver algorithm
+    :param cache_key: Key of the results in the persistent cache (None to always solve)
+    :return: scores, iterations of all results
+    """
+    if cache_key is None:
+        solver.try_solve()
+        return solver.scores_array(), solver.iterations_array()
+
+    path = os.path.join(CACHE_DIR, f'{cache_key}.npz')
+    if os.path.exists(path):
+        # mark as recently used
+        os.utime(path)
+        with np.load(path) as cached:
+            return cached['scores'], cached['iterations']
+
+    solver.try_solve()
+    scores, iterations = solver.scores_array(), solver.iterations_array()
+    _store_results(path, scores, iterations)
+    _evict_cache()
+    return scores, iterations
+
+
+def _store_results(path: str, scores: np.array, iterations: np.array):
+    """
+    Stores results to the cache atomically, interrupted write does not leave a broken file
+    :param path: Path of the cached results
+    """
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=CACHE_DIR, suffix='.tmp', delete=False) as f:
+        tmp_path = f.name
+        try:
+            np.savez(f, scores=scores, iterations=iterations)
+        except BaseException:
+            f.close()
+            os.remove(tmp_path)
+            raise
+    os.replace(tmp_path, path)
+
+
+def _evict_cache():
+    """
+    Removes least recently used results so that the cache holds at most CACHE_SIZE of them
+    Other processes may evict the same files concurrently
+    """
+    entries = []
+    for entry in os.scandir(CACHE_DIR):
+        if entry.name.endswith('.npz'):
+            try:
+                entries.append((entry.stat().st_mtime, entry.path))
+            except FileNotFoundError:
+                continue
+    if len(entries) <= CACHE_SIZE:
+        return
+    entries.sort()
+    for _, path in entries[:len(entries) - CACHE_SIZE]:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
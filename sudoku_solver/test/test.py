@@ -1,6 +1,10 @@
 """
 Handles sudoku algorithms time performance testing
 """
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
 from test import _engine
 from sudoku.board import Board
 from sudoku.solve import HillClimbing, CustomBetaHC, PaperBetaHC
@@ -16,6 +20,20 @@ RESTARTS_BETA_STATIC = 5
 MAX_ITER_BETA_STATIC = 25000
 
 SOLUTIONS_NUM = 50
+# processes running time measurements (None for number of CPUs)
+WORKERS = None
+
+NS_PER_SEC = 1e9
+
+# output formats
+_ANALYSIS_TEMPLATE = ('\tsteps minimum: {}\n'
+                      '\tsteps maximum: {}\n'
+                      '\tsteps average: {}\n'
+                      '\taccuracy: {:.4f} %')
+_TIMES_TEMPLATE = ('\tbest time: {:.4f}s\n'
+                   '\tworst time: {:.4f}s\n'
+                   '\taverage time: {:.4f}s\n'
+                   '\ttotal time: {:.2f}s')
 
 
 def test_performance_local(board_size):
@@ -32,8 +50,9 @@ def test_performance_local(board_size):
         return
 
     # measure times
-    solver = HillClimbing(board, 1, MAX_ITER_LOCAL_STATIC, stop_if_found=True)
-    times = _engine.test_time_perfect(solver, SOLUTIONS_NUM)
+    _warmup_numba(board)
+    solver_factory = _solver_factory(HillClimbing, board, 1, MAX_ITER_LOCAL_STATIC, stop_if_found=True)
+    times = _engine.test_time_perfect(solver_factory, SOLUTIONS_NUM, WORKERS, race=True)
 
     # print results
     _print_times(*times)
@@ -53,8 +72,10 @@ def test_performance_beta(board_size):
         return
 
     # measure times
-    solver = CustomBetaHC(board, 1, MAX_ITER_BETA_STATIC, N_PROB_STATIC, BETA_PROB_STATIC, stop_if_found=True)
-    times = _engine.test_time_perfect(solver, SOLUTIONS_NUM)
+    _warmup_numba(board)
+    solver_factory = _solver_factory(CustomBetaHC, board, 1, MAX_ITER_BETA_STATIC, N_PROB_STATIC, BETA_PROB_STATIC,
+                                     stop_if_found=True)
+    times = _engine.test_time_perfect(solver_factory, SOLUTIONS_NUM, WORKERS, race=True)
 
     # print results
     _print_times(*times)
@@ -74,8 +95,9 @@ def test_starts_local(board_size):
         return
 
     # measure times
-    solver = HillClimbing(board, 1, MAX_ITER_LOCAL_STATIC)
-    times = _engine.test_time_separate(solver, RESTARTS_LOCAL_STATIC)
+    _warmup_numba(board)
+    solver_factory = _solver_factory(HillClimbing, board, 1, MAX_ITER_LOCAL_STATIC)
+    times = _engine.test_time_separate(solver_factory, RESTARTS_LOCAL_STATIC, WORKERS)
 
     # print results
     _print_times(*times)
@@ -95,18 +117,20 @@ def test_starts_beta(board_size):
         return
 
     # measure times
-    solver = CustomBetaHC(board, 1, MAX_ITER_BETA_STATIC, N_PROB_STATIC, BETA_PROB_STATIC)
-    times = _engine.test_time_separate(solver, RESTARTS_BETA_STATIC)
+    _warmup_numba(board)
+    solver_factory = _solver_factory(CustomBetaHC, board, 1, MAX_ITER_BETA_STATIC, N_PROB_STATIC, BETA_PROB_STATIC)
+    times = _engine.test_time_separate(solver_factory, RESTARTS_BETA_STATIC, WORKERS)
 
     # print results
     _print_times(*times)
 
 
-def test_itrs_local(board_size):
+def test_itrs_local(board_size, cache_solutions: bool = True):
     """
     Tests different distribution between number of max iterations vs number of restarts in basic hill climbing
     Displays the results
     :param board_size: size of a board to test on
+    :param cache_solutions: reuse results of previous runs with the same board and configuration
     """
     # init test board
     board = Board(size=board_size)
@@ -116,14 +140,16 @@ def test_itrs_local(board_size):
         return
 
     # actual test
-    _test_iter(initializer=_create_local, board=board, sum_steps=100000, min_steps=100, growth=2)
+    _test_iter(initializer=_create_local, board=board, sum_steps=100000, min_steps=100, growth=2,
+               cache_solutions=cache_solutions)
 
 
-def test_itrs_beta(board_size):
+def test_itrs_beta(board_size, cache_solutions: bool = True):
     """
     Tests different distribution between number of max iterations vs number of restarts in beta hill climbing
     Displays the results
     :param board_size: size of a board to test on
+    :param cache_solutions: reuse results of previous runs with the same board and configuration
     """
     # init test board
     board = Board(size=board_size)
@@ -133,10 +159,40 @@ def test_itrs_beta(board_size):
         return
 
     # actual test
-    _test_iter(initializer=_create_beta, board=board, sum_steps=1000000, min_steps=1000, growth=2)
+    _test_iter(initializer=_create_beta, board=board, sum_steps=1000000, min_steps=1000, growth=2,
+               cache_solutions=cache_solutions)
 
 
-def _test_iter(initializer, board, sum_steps, min_steps, growth):
+def _warmup_numba(board):
+    """
+    Runs compiled hill climbing kernels once, so that their compilation is not billed to the first measured run
+    Worker processes are forked afterwards, so they inherit the compiled kernels
+    :param board: Test board
+    """
+    HillClimbing(board.copy(), 1, 1).try_solve()
+    CustomBetaHC(board.copy(), 1, 1, N_PROB_STATIC, BETA_PROB_STATIC).try_solve()
+
+
+def _solver_factory(solver_cls, board, *args, **kwargs):
+    """
+    The board is pickled once, each created solver gets its own copy
+    :param solver_cls: Class of the solver
+    :param board: Test board in initial state
+    :return: Picklable function creating new solver
+    """
+    return partial(_new_solver, solver_cls, pickle.dumps(board), *args, **kwargs)
+
+
+def _new_solver(solver_cls, template: bytes, *args, **kwargs):
+    """
+    :param solver_cls: Class of the solver
+    :param template: Pickled test board
+    :return: New solver on a copy of the board
+    """
+    return solver_cls(pickle.loads(template), *args, **kwargs)
+
+
+def _test_iter(initializer, board, sum_steps, min_steps, growth, cache_solutions: bool = False):
     """
     Tests iteration distribution for a solver
     Displays the results
@@ -145,20 +201,51 @@ def _test_iter(initializer, board, sum_steps, min_steps, growth):
     :param sum_steps: summary of steps in all iterations (<number of restarts> * <number of iterations>)
     :param min_steps: minimal number of steps per restart
     :param growth: exponential growth in restarts
+    :param cache_solutions: reuse results of previous runs with the same board and configuration
     """
     # start with 1 restart, continually increase the number of restarts while distributing the steps among them
+    rungs = []
     steps = sum_steps
     restarts = 1
     while steps >= min_steps:
-        print(f'[restarts = {restarts}, steps = {steps}]:')
-        # analyze current steps distribution
-        solver = initializer(board, restarts, steps)
-        # print the result
-        _print_analysis(_engine.analyze_solver(solver))
-        # update distribution
+        rungs.append((restarts, steps))
         steps //= growth
         restarts *= growth
 
+    # distributions are independent, analyze them in separate processes
+    _warmup_numba(board)
+    analyze = partial(_analyze_rung, initializer, board, cache_solutions)
+    with ProcessPoolExecutor(max_workers=WORKERS) as executor:
+        for (restarts, steps), analysis in zip(rungs, executor.map(analyze, rungs)):
+            print(f'[restarts = {restarts}, steps = {steps}]:')
+            # print the result
+            _print_analysis(analysis)
+
+
+def _analyze_rung(initializer, board, cache_solutions: bool, rung) -> _engine.RunAnalysis:
+    """
+    Analyzes one steps distribution
+    :param initializer: Function which instantiates new solver
+    :param board: Test board
+    :param cache_solutions: reuse results of previous runs with the same board and configuration
+    :param rung: number of restarts, number of steps per restart
+    :return: Analysis of the solver
+    """
+    restarts, steps = rung
+    solver = initializer(board, restarts, steps)
+    key = _cache_key(cache_solutions, board, solver)
+    return _engine.analyze_solver(solver, key)
+
+
+def _cache_key(cache_solutions: bool, board, solver):
+    """
+    :param cache_solutions: whether results are cached
+    :param board: Test board
+    :param solver: Solver of the board
+    :return: Key of the solver results in the cache, None if results are not cached
+    """
+    return _engine.cache_key(board, solver) if cache_solutions else None
+
 
 def _create_local(board, restarts, max_itr):
     """
@@ -174,11 +261,12 @@ def _create_beta(board, restarts, max_itr):
     return CustomBetaHC(board, restarts, max_itr, n=N_PROB_STATIC, beta=BETA_PROB_STATIC)
 
 
-def test_n_prob(board_size):
+def test_n_prob(board_size, cache_solutions: bool = True):
     """
     Tests n probability for beta hill climbing
     Displays the results
     :param board_size: size of a board to test on
+    :param cache_solutions: reuse results of previous runs with the same board and configuration
     """
     # init test board
     board = Board(size=board_size)
@@ -193,8 +281,9 @@ def test_n_prob(board_size):
         print(f'[n probability = {n:.2f}]:')
         # analyze current steps distribution
         solver = CustomBetaHC(board, RESTARTS_BETA_STATIC, MAX_ITER_BETA_STATIC, N_PROB_STATIC, n)
+        key = _cache_key(cache_solutions, board, solver)
         # print the result
-        _print_analysis(_engine.analyze_solver(solver))
+        _print_analysis(_engine.analyze_solver(solver, key))
         # update beta
         n -= 0.05
         n = round(n, 2)
@@ -202,11 +291,12 @@ def test_n_prob(board_size):
             break
 
 
-def test_beta_prob(board_size):
+def test_beta_prob(board_size, cache_solutions: bool = True):
     """
     Tests beta probability for beta hill climbing
     Displays the results
     :param board_size: size of a board to test on
+    :param cache_solutions: reuse results of previous runs with the same board and configuration
     """
     # init test board
     board = Board(size=board_size)
@@ -221,8 +311,9 @@ def test_beta_prob(board_size):
         print(f'[beta probability = {beta:.2f}]:')
         # analyze current steps distribution
         solver = CustomBetaHC(board, RESTARTS_BETA_STATIC, MAX_ITER_BETA_STATIC, N_PROB_STATIC, beta)
+        key = _cache_key(cache_solutions, board, solver)
         # print the result
-        _print_analysis(_engine.analyze_solver(solver))
+        _print_analysis(_engine.analyze_solver(solver, key))
         # update beta
         beta = beta - 0.2 if beta > 0.1 else beta - 0.01
         beta = round(beta, 2)
@@ -230,30 +321,19 @@ def test_beta_prob(board_size):
             break
 
 
-def _to_percent(val: float) -> str:
-    """
-    :return: Percentage representation of a float
-    """
-    return f'{(val * 100):.4f} %'
-
-
 def _print_analysis(analysis: _engine.RunAnalysis):
     """
     Prints run analysis
     """
-    print(f'\tsteps minimum: {analysis.itr_min}\n'
-          f'\tsteps maximum: {analysis.itr_max}\n'
-          f'\tsteps average: {analysis.itr_avg}\n'
-          f'\taccuracy: {_to_percent(analysis.accuracy)}')
+    print(_ANALYSIS_TEMPLATE.format(analysis.itr_min, analysis.itr_max, analysis.itr_avg, analysis.accuracy * 100))
 
 
 def _print_times(time_min, time_max, time_avg, time_sum):
     """
     Prints time test results
+    Times are given in nanoseconds, they are displayed in seconds
     """
-    print(f'\tbest time: {time_min:.4f}s\n'
-          f'\tworst time: {time_max:.4f}s\n'
-          f'\taverage time: {time_avg:.4f}s\n'
-          f'\ttotal time: {time_sum:.2f}s')
+    print(_TIMES_TEMPLATE.format(time_min / NS_PER_SEC, time_max / NS_PER_SEC, time_avg / NS_PER_SEC,
+                                 time_sum / NS_PER_SEC))
 
 